@@ -1,24 +1,39 @@
 """AI 服务模块 - 调用 LLM API 将文件内容转换为标准试卷 Markdown。"""
 
 import asyncio
+import io
 import json
 import logging
 import re
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 import httpx
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson 未安装时退回标准库
+    _json_loads = json.loads
+
 from app.config import AI_API_BASE, AI_API_KEY, AI_MODEL, AI_PROVIDER
 
 logger = logging.getLogger(__name__)
 
 MAX_INPUT_CHARS = 15000
 
+# 用户消息中试卷文本前的提示语
+_USER_PREFIX = "请将以下试卷内容转换为标准 Markdown 格式：\n\n"
+
+# 代码块标记（预编译，避免每次调用重复查找正则缓存）
+_FENCE_OPEN = re.compile(r'^```(?:markdown|md)?\s*\n')
+_FENCE_CLOSE = re.compile(r'\n```\s*$')
+
 
 def _clean_markdown(text: str) -> str:
     """去掉 AI 返回中可能包裹的代码块标记。"""
-    text = re.sub(r'^```(?:markdown|md)?\s*\n', '', text.strip())
-    text = re.sub(r'\n```\s*$', '', text.strip())
-    return text.strip()
+    text = _FENCE_OPEN.sub('', text.strip())
+    return _FENCE_CLOSE.sub('', text).strip()
 
 
 # 导出给 main.py 使用
@@ -84,6 +99,70 @@ title: 试卷标题（从内容中提取）
 """
 
 
+# 进程级共享的 HTTP 客户端，复用连接与 TLS 会话
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """获取共享的 AsyncClient（首次调用时创建）。"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(300.0, connect=30.0),
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """关闭共享的 AsyncClient（应用退出时调用）。"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _decode_sse(buf: bytes, remainder: bytes) -> tuple[list[bytes], bytes]:
+    """单次前向扫描，从字节流中切出 SSE 的 data 字段。
+
+    Args:
+        buf: 本次收到的字节块
+        remainder: 上一块末尾未以换行结束的残留字节
+
+    Returns:
+        (data 字段列表, 新的残留字节)
+    """
+    data = remainder + buf if remainder else buf
+    payloads: list[bytes] = []
+    start = 0
+    while True:
+        end = data.find(b"\n", start)
+        if end < 0:
+            break
+        # 原地比较前缀，注释行（以 : 开头）、空行及其他字段不做任何切片
+        if data.startswith(b"data:", start):
+            i = start + 6 if data.startswith(b" ", start + 5) else start + 5
+            stop = end - 1 if end > i and data[end - 1] == 0x0D else end
+            payloads.append(data[i:stop])
+        start = end + 1
+    return payloads, data[start:]
+
+
+async def _iter_sse_events(response: httpx.Response) -> AsyncGenerator[dict, None]:
+    """逐条 yield SSE 响应中解码后的事件，遇到 [DONE] 结束。"""
+    remainder = b""
+    async for buf in response.aiter_bytes():
+        payloads, remainder = _decode_sse(buf, remainder)
+        for payload in payloads:
+            if payload.strip() == b"[DONE]":
+                return
+            try:
+                yield _json_loads(payload)
+            except json.JSONDecodeError:
+                continue
+
+
 async def stream_ai_chunks(file_content: str) -> AsyncGenerator[str, None]:
     """异步生成器，逐片段 yield AI 返回的文本。
 
@@ -93,11 +172,12 @@ async def stream_ai_chunks(file_content: str) -> AsyncGenerator[str, None]:
     Yields:
         AI 生成的文本片段
     """
+    # 截断与拼接提示语在同一个表达式中完成
     if len(file_content) > MAX_INPUT_CHARS:
         logger.warning("文本过长 (%d)，截断至 %d", len(file_content), MAX_INPUT_CHARS)
-        file_content = file_content[:MAX_INPUT_CHARS] + "\n\n[... 内容过长已截断 ...]"
-
-    user_content = f"请将以下试卷内容转换为标准 Markdown 格式：\n\n{file_content}"
+        user_content = f"{_USER_PREFIX}{file_content[:MAX_INPUT_CHARS]}\n\n[... 内容过长已截断 ...]"
+    else:
+        user_content = _USER_PREFIX + file_content
 
     if AI_PROVIDER == "openai":
         url = f"{AI_API_BASE}/v1/chat/completions"
@@ -129,59 +209,47 @@ async def stream_ai_chunks(file_content: str) -> AsyncGenerator[str, None]:
             "messages": [{"role": "user", "content": user_content}],
         }
 
-    logger.info("AI [%s] 流式请求，模型: %s，长度: %d", AI_PROVIDER, AI_MODEL, len(file_content))
-
-    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0, connect=30.0)) as client:
-        async with client.stream("POST", url, headers=headers, json=body) as response:
-            if response.status_code in (502, 503, 504, 529):
-                raise RuntimeError(f"AI API 暂时不可用 ({response.status_code})，请稍后重试")
-            if response.status_code != 200:
-                error_body = await response.aread()
-                raise RuntimeError(
-                    f"AI API 错误 ({response.status_code}): "
-                    f"{error_body.decode('utf-8', errors='replace')[:300]}"
-                )
-
-            async for line in response.aiter_lines():
-                if not line.startswith("data: "):
-                    continue
-                data_str = line[6:]
-                if data_str.strip() == "[DONE]":
-                    break
-                try:
-                    event = json.loads(data_str)
-                except json.JSONDecodeError:
-                    continue
-
-                # Anthropic SSE
-                if "type" in event:
-                    etype = event["type"]
-                    if etype == "content_block_delta":
-                        delta = event.get("delta", {})
-                        if delta.get("type") == "text_delta":
-                            yield delta["text"]
-                    elif etype == "error":
-                        err = event.get("error", {})
-                        raise RuntimeError(f"AI 错误: {err.get('message', str(err))}")
-
-                # OpenAI SSE (DeepSeek 等)
-                elif "choices" in event:
-                    for choice in event["choices"]:
-                        content = choice.get("delta", {}).get("content")
-                        if content:
-                            yield content
+    logger.info("AI [%s] 流式请求，模型: %s，长度: %d", AI_PROVIDER, AI_MODEL, len(user_content))
+
+    async with get_client().stream("POST", url, headers=headers, json=body) as response:
+        if response.status_code in (502, 503, 504, 529):
+            raise RuntimeError(f"AI API 暂时不可用 ({response.status_code})，请稍后重试")
+        if response.status_code != 200:
+            error_body = await response.aread()
+            raise RuntimeError(
+                f"AI API 错误 ({response.status_code}): "
+                f"{error_body.decode('utf-8', errors='replace')[:300]}"
+            )
+
+        async for event in _iter_sse_events(response):
+            # Anthropic SSE
+            if "type" in event:
+                etype = event["type"]
+                if etype == "content_block_delta":
+                    delta = event.get("delta", {})
+                    if delta.get("type") == "text_delta":
+                        yield delta["text"]
+                elif etype == "error":
+                    err = event.get("error", {})
+                    raise RuntimeError(f"AI 错误: {err.get('message', str(err))}")
+
+            # OpenAI SSE (DeepSeek 等)
+            elif "choices" in event:
+                for choice in event["choices"]:
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
 
 
 async def parse_to_markdown(file_content: str) -> str:
     """非流式版本，收集所有片段返回完整 Markdown。"""
-    chunks: list[str] = []
     max_retries = 2
     for attempt in range(max_retries + 1):
         try:
-            chunks = []
+            buf = io.StringIO()
             async for chunk in stream_ai_chunks(file_content):
-                chunks.append(chunk)
-            result = "".join(chunks)
+                buf.write(chunk)
+            result = buf.getvalue()
             if not result.strip():
                 raise RuntimeError("AI 返回了空内容")
             return _clean_markdown(result)
@@ -1,24 +1,25 @@
 """认证模块 - 邮箱验证码登录。"""
 
-import random
-import string
+import functools
+import secrets
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import aiosmtplib
+import jwt
 from email.mime.text import MIMEText
-from jose import jwt
 
 from app.config import (
     JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRE_HOURS,
     SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS,
 )
-from app.database import get_db
+from app.database import transaction
 
 
 def generate_code() -> str:
-    """生成 6 位数字验证码。"""
-    return ''.join(random.choices(string.digits, k=6))
+    """生成 6 位数字验证码（使用密码学安全的随机数）。"""
+    return f"{secrets.randbelow(1_000_000):06d}"
 
 
 def create_token(user_id: int, email: str) -> str:
@@ -40,20 +41,31 @@ def create_token(user_id: int, email: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+@functools.lru_cache(maxsize=4096)
+def _decode_token(token: str) -> Optional[dict]:
+    """解码并校验签名，按 token 字符串缓存结果。"""
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+
+
 def verify_token(token: str) -> Optional[dict]:
     """验证 JWT token。
 
+    签名校验结果按 token 缓存，过期时间在每次调用时单独检查，
+    因此缓存命中的 token 过期后同样会被拒绝。
+
     Args:
         token: JWT token 字符串
 
     Returns:
         解码后的 payload，验证失败返回 None
     """
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except Exception:
+    payload = _decode_token(token)
+    if payload is None or payload["exp"] <= time.time():
         return None
+    return dict(payload)
 
 
 async def send_verify_code(email: str, code: str) -> bool:
@@ -92,46 +104,44 @@ async def send_verify_code(email: str, code: str) -> bool:
 
 async def save_code(email: str, code: str) -> None:
     """保存验证码到数据库。"""
-    db = await get_db()
-    try:
+    async with transaction() as db:
         await db.execute(
             "INSERT INTO verify_codes (email, code) VALUES (?, ?)",
             (email, code),
         )
-        await db.commit()
-    finally:
-        await db.close()
 
 
 async def check_code(email: str, code: str) -> bool:
-    """检查验证码是否有效（10 分钟内未使用）。"""
-    db = await get_db()
-    try:
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=10)
+    """检查验证码是否有效（10 分钟内未使用），有效则同时标记为已使用。"""
+    # 查找与标记合并为一条 UPDATE ... RETURNING（需 SQLite 3.35+）；
+    # 截止时间用 SQLite 的 datetime() 计算，与 CURRENT_TIMESTAMP 格式一致
+    async with transaction() as db:
         cursor = await db.execute(
-            """SELECT id FROM verify_codes
-               WHERE email = ? AND code = ? AND used = 0
-               AND created_at > ?
-               ORDER BY created_at DESC LIMIT 1""",
-            (email, code, cutoff.isoformat()),
+            """UPDATE verify_codes SET used = 1
+               WHERE id = (
+                   SELECT id FROM verify_codes
+                   WHERE email = ? AND code = ? AND used = 0
+                   AND created_at > datetime('now', '-10 minutes')
+                   ORDER BY created_at DESC LIMIT 1
+               )
+               RETURNING id""",
+            (email, code),
         )
         row = await cursor.fetchone()
-        if row:
-            await db.execute(
-                "UPDATE verify_codes SET used = 1 WHERE id = ?",
-                (row[0],),
-            )
-            await db.commit()
-            return True
-        return False
-    finally:
-        await db.close()
+        return row is not None
+
+
+async def purge_expired_codes() -> None:
+    """删除已使用或已过期的验证码，保持 verify_codes 表规模有界。"""
+    async with transaction() as db:
+        await db.execute(
+            "DELETE FROM verify_codes WHERE created_at < datetime('now', '-15 minutes') OR used = 1"
+        )
 
 
 async def get_or_create_user(email: str) -> int:
     """获取或创建用户，返回用户 ID。"""
-    db = await get_db()
-    try:
+    async with transaction(immediate=True) as db:
         cursor = await db.execute(
             "SELECT id FROM users WHERE email = ?", (email,)
         )
@@ -142,7 +152,4 @@ async def get_or_create_user(email: str) -> int:
         cursor = await db.execute(
             "INSERT INTO users (email) VALUES (?)", (email,)
         )
-        await db.commit()
         return cursor.lastrowid
-    finally:
-        await db.close()
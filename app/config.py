@@ -10,10 +10,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 UPLOAD_DIR = DATA_DIR / "uploads"
 OUTPUT_DIR = DATA_DIR / "outputs"
+PARSE_CACHE_DIR = DATA_DIR / "cache" / "parsed"
 TEMPLATE_DIR = BASE_DIR / "templates"
 
 # 确保目录存在
-for d in [DATA_DIR, UPLOAD_DIR, OUTPUT_DIR]:
+for d in [DATA_DIR, UPLOAD_DIR, OUTPUT_DIR, PARSE_CACHE_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
 # AI API 配置
@@ -40,6 +41,10 @@ DATABASE_URL = str(DATA_DIR / "exam_factory.db")
 # 限制
 MAX_FILE_SIZE_MB = 20
 MAX_DAILY_USES = 10
+PARSE_CACHE_MAX_MB = 200
+
+# 过期验证码清理间隔（秒）
+VERIFY_CODE_PURGE_INTERVAL = 300
 
 # LaTeX 相关
 LATEX_TEMPLATE_DIR = BASE_DIR / "latex_templates"
@@ -1,62 +1,148 @@
 """数据库模块 - SQLite 异步操作。"""
 
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 import aiosqlite
 from app.config import DATABASE_URL
 
 
+class Database:
+    """进程级共享的 SQLite 连接，启动时打开、退出时关闭。
+
+    所有查询复用同一连接，避免每次查询都新建后台线程和打开文件；
+    写操作通过 asyncio.Lock 串行化，防止不同请求的事务交错提交。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+
+    async def connect(self) -> None:
+        """打开连接并设置 PRAGMA。"""
+        if self._conn is not None:
+            return
+        conn = await aiosqlite.connect(self.path, check_same_thread=False)
+        conn.row_factory = aiosqlite.Row
+        await conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA cache_size = -20000;
+        """)
+        self._conn = conn
+
+    async def close(self) -> None:
+        """关闭连接。"""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            raise RuntimeError("数据库未初始化")
+        return self._conn
+
+    @asynccontextmanager
+    async def transaction(self, immediate: bool = False) -> AsyncIterator[aiosqlite.Connection]:
+        """写事务：成功时提交，异常时回滚。
+
+        Args:
+            immediate: 是否以 BEGIN IMMEDIATE 开始（读后写的流程需要）
+        """
+        async with self._write_lock:
+            conn = self.conn
+            if immediate:
+                await conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            else:
+                await conn.commit()
+
+
+_database = Database(DATABASE_URL)
+
+
 async def get_db() -> aiosqlite.Connection:
-    """获取数据库连接。"""
-    db = await aiosqlite.connect(DATABASE_URL)
-    db.row_factory = aiosqlite.Row
-    return db
+    """获取共享的数据库连接（可直接调用，也可作为 FastAPI 依赖）。"""
+    return _database.conn
+
+
+def transaction(immediate: bool = False):
+    """获取写事务上下文，用法：``async with transaction() as db: ...``。"""
+    return _database.transaction(immediate)
+
+
+async def close_db() -> None:
+    """关闭共享的数据库连接。"""
+    await _database.close()
 
 
 async def init_db() -> None:
-    """初始化数据库表结构。"""
-    db = await get_db()
-    try:
-        await db.executescript("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS verify_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL,
-                code TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                used INTEGER DEFAULT 0
-            );
-
-            CREATE TABLE IF NOT EXISTS usage_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                action TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            );
-
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                status TEXT DEFAULT 'pending',
-                title TEXT,
-                school TEXT,
-                theme TEXT DEFAULT '4e9b86',
-                original_filename TEXT,
-                markdown_content TEXT,
-                pdf_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            );
-        """)
-        # 创建默认 guest 用户（临时测试用）
+    """打开共享连接并初始化数据库表结构。"""
+    await _database.connect()
+    db = _database.conn
+    await db.executescript("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS verify_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            code TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            used INTEGER DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS usage_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            title TEXT,
+            school TEXT,
+            theme TEXT DEFAULT '4e9b86',
+            original_filename TEXT,
+            markdown_content TEXT,
+            pdf_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS parse_cache (
+            digest TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_verify_codes_email_code
+            ON verify_codes(email, code, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_usage_log_user_action_date
+            ON usage_log(user_id, action, created_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user
+            ON tasks(user_id, id);
+        CREATE INDEX IF NOT EXISTS idx_parse_cache_last_used
+            ON parse_cache(last_used);
+    """)
+    # 创建默认 guest 用户（临时测试用）
+    async with transaction() as db:
         await db.execute(
             "INSERT OR IGNORE INTO users (id, email) VALUES (1, 'guest@test.com')"
         )
-        await db.commit()
-    finally:
-        await db.close()
@@ -2,9 +2,6 @@
 
 from pathlib import Path
 
-import docx
-import pdfplumber
-
 
 def parse_docx(file_path: Path) -> str:
     """从 Word 文档提取文本。
@@ -15,6 +12,9 @@ def parse_docx(file_path: Path) -> str:
     Returns:
         提取的文本内容
     """
+    # 延迟导入：只有真正解析 docx 时才加载
+    import docx
+
     doc = docx.Document(str(file_path))
     paragraphs = []
     for para in doc.paragraphs:
@@ -41,6 +41,9 @@ def parse_pdf(file_path: Path) -> str:
     Returns:
         提取的文本内容
     """
+    # 延迟导入：pdfplumber 会连带加载 pdfminer、PIL 等
+    import pdfplumber
+
     text_parts = []
     with pdfplumber.open(str(file_path)) as pdf:
         for page in pdf.pages:
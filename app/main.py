@@ -1,9 +1,18 @@
 """试卷工厂 - FastAPI 主应用。"""
 
+import asyncio
+import hashlib
+import io
 import json
 import logging
+import multiprocessing
+import os
+import time
 import traceback
-from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
@@ -13,16 +22,25 @@ from fastapi.templating import Jinja2Templates
 
 from app.config import (
     UPLOAD_DIR, OUTPUT_DIR, MAX_FILE_SIZE_MB, MAX_DAILY_USES,
-    TEMPLATE_DIR, BASE_DIR,
+    TEMPLATE_DIR, BASE_DIR, VERIFY_CODE_PURGE_INTERVAL,
 )
-from app.database import init_db, get_db
+from app.database import init_db, close_db, get_db, transaction
 from app.auth import (
     generate_code, send_verify_code, save_code, check_code,
-    get_or_create_user, create_token, verify_token,
+    get_or_create_user, create_token, verify_token, purge_expired_codes,
 )
 from app.file_parser import parse_file
-from app.ai_service import stream_ai_chunks, clean_markdown
-from app.pdf_generator import generate_both_pdfs
+from app.parse_cache import get_cached_text, save_cached_text
+from app.ai_service import stream_ai_chunks, clean_markdown, close_client
+
+try:
+    import orjson
+
+    def _json_dumps(data: object) -> str:
+        return orjson.dumps(data).decode()
+except ImportError:  # orjson 未安装时退回标准库
+    def _json_dumps(data: object) -> str:
+        return json.dumps(data, ensure_ascii=False)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,16 +50,78 @@ app = FastAPI(title="试卷工厂", version="1.0.0")
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 templates = Jinja2Templates(directory=str(TEMPLATE_DIR))
 
+# 上传文件分块读取、下载文件分块发送的块大小
+UPLOAD_CHUNK_SIZE = 1 << 20
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
 
 def _sse(data: dict) -> str:
     """构造 SSE 事件字符串。"""
-    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"data: {_json_dumps(data)}\n\n"
+
+
+def _sse_chunk(text: str) -> str:
+    """构造 AI 文本片段事件（每个 token 一次的热路径，只序列化文本本身）。"""
+    return f'data: {{"type":"chunk","text":{_json_dumps(text)}}}\n\n'
+
+
+def _new_parser_pool() -> ProcessPoolExecutor:
+    """创建文件解析进程池。
+
+    工作进程由 forkserver 创建，不直接从已运行 aiosqlite 和执行器线程的主进程 fork。
+    """
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+
+
+async def _parse_in_pool(file_path: Path) -> str:
+    """在进程池中解析文件；工作进程异常退出（如 OOM）导致进程池损坏时换新池重试一次。
+
+    Raises:
+        HTTPException: 重试后进程池仍然损坏
+    """
+    loop = asyncio.get_running_loop()
+    for _ in range(2):
+        pool = app.state.parser_pool
+        try:
+            return await loop.run_in_executor(pool, parse_file, file_path)
+        except BrokenProcessPool:
+            logger.error("文件解析进程池已损坏，重新创建")
+            # 并发请求可能已经换过新池，只替换自己用到的旧池
+            if app.state.parser_pool is pool:
+                app.state.parser_pool = _new_parser_pool()
+                pool.shutdown(wait=False)
+    raise HTTPException(status_code=503, detail="文件解析服务暂不可用，请稍后重试")
+
+
+async def _purge_codes_periodically() -> None:
+    """后台任务：定期清理过期验证码。"""
+    while True:
+        await asyncio.sleep(VERIFY_CODE_PURGE_INTERVAL)
+        try:
+            await purge_expired_codes()
+        except Exception as e:
+            logger.error("清理过期验证码失败: %s", e)
 
 
 @app.on_event("startup")
 async def startup():
-    """应用启动时初始化数据库。"""
+    """应用启动时初始化数据库，创建文件解析进程池并启动验证码清理任务。"""
     await init_db()
+    # pdfplumber 等解析器是纯 Python 的 CPU 密集操作，放到子进程避免阻塞事件循环
+    app.state.parser_pool = _new_parser_pool()
+    app.state.purge_task = asyncio.create_task(_purge_codes_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """应用退出时停止后台任务，释放进程池、共享的 HTTP 连接和数据库连接。"""
+    app.state.purge_task.cancel()
+    app.state.parser_pool.shutdown()
+    await close_client()
+    await close_db()
 
 
 # ============================================================
@@ -101,27 +181,21 @@ async def api_logout():
 async def check_daily_limit(user_id: int) -> None:
     """检查每日使用次数。"""
     db = await get_db()
-    try:
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM usage_log WHERE user_id = ? AND action = 'generate' AND DATE(created_at) = ?",
-            (user_id, today),
-        )
-        row = await cursor.fetchone()
-        if row[0] >= MAX_DAILY_USES:
-            raise HTTPException(status_code=429, detail=f"每日最多 {MAX_DAILY_USES} 次")
-    finally:
-        await db.close()
+    # 用半开区间代替 DATE(created_at)，以便命中 usage_log 索引
+    today = datetime.now(timezone.utc).date()
+    cursor = await db.execute(
+        "SELECT COUNT(*) FROM usage_log WHERE user_id = ? AND action = 'generate' AND created_at >= ? AND created_at < ?",
+        (user_id, today.isoformat(), (today + timedelta(days=1)).isoformat()),
+    )
+    row = await cursor.fetchone()
+    if row[0] >= MAX_DAILY_USES:
+        raise HTTPException(status_code=429, detail=f"每日最多 {MAX_DAILY_USES} 次")
 
 
 async def log_usage(user_id: int, action: str) -> None:
     """记录使用日志。"""
-    db = await get_db()
-    try:
+    async with transaction() as db:
         await db.execute("INSERT INTO usage_log (user_id, action) VALUES (?, ?)", (user_id, action))
-        await db.commit()
-    finally:
-        await db.close()
 
 
 @app.post("/api/upload")
@@ -136,40 +210,53 @@ async def api_upload(
     user_id = int(user["sub"])
     await check_daily_limit(user_id)
 
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE_MB * 1024 * 1024:
-        raise HTTPException(status_code=400, detail=f"文件不能超过 {MAX_FILE_SIZE_MB}MB")
-
     suffix = Path(file.filename).suffix.lower()
     if suffix not in (".docx", ".pdf", ".txt", ".md"):
         raise HTTPException(status_code=400, detail="仅支持 docx、pdf、txt、md 格式")
 
+    # 分块读取并落盘，边写边算摘要，单请求峰值内存只有一个块
+    loop = asyncio.get_running_loop()
     file_path = UPLOAD_DIR / f"{user_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{suffix}"
-    file_path.write_bytes(content)
+    hasher = hashlib.sha256()
+    size = 0
+    with file_path.open("wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_FILE_SIZE_MB * 1024 * 1024:
+                break
+            hasher.update(chunk)
+            await loop.run_in_executor(None, f.write, chunk)
+    if size > MAX_FILE_SIZE_MB * 1024 * 1024:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail=f"文件不能超过 {MAX_FILE_SIZE_MB}MB")
+    digest = hasher.hexdigest()
 
-    try:
-        text = parse_file(file_path)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"文件解析失败: {e}")
+    # 相同内容的文件重复上传时直接复用解析结果
+    text = await get_cached_text(digest)
+    if text is None:
+        try:
+            text = await _parse_in_pool(file_path)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"文件解析失败: {e}")
+        if text.strip():
+            await save_cached_text(digest, text)
 
     if not text.strip():
         raise HTTPException(status_code=400, detail="文件内容为空")
 
     # 建任务
-    db = await get_db()
-    try:
+    async with transaction() as db:
         cursor = await db.execute(
             "INSERT INTO tasks (user_id, title, school, theme, original_filename, status) VALUES (?, ?, ?, ?, ?, 'pending')",
             (user_id, title, school, theme, file.filename),
         )
-        await db.commit()
         task_id = cursor.lastrowid
-    finally:
-        await db.close()
 
     # 保存原始文本供后续解析
     raw_path = UPLOAD_DIR / f"{task_id}_raw.txt"
-    raw_path.write_text(text, encoding="utf-8")
+    await loop.run_in_executor(None, partial(raw_path.write_text, text, encoding="utf-8"))
 
     return {"task_id": task_id, "text_length": len(text)}
 
@@ -185,24 +272,20 @@ async def api_parse_stream(task_id: int, user: dict = Depends(get_current_user))
     text = raw_path.read_text(encoding="utf-8")
 
     async def generate():
-        collected: list[str] = []
+        buf = io.StringIO()
         try:
             async for chunk in stream_ai_chunks(text):
-                collected.append(chunk)
-                yield _sse({"type": "chunk", "text": chunk})
+                buf.write(chunk)
+                yield _sse_chunk(chunk)
 
-            full_md = clean_markdown("".join(collected))
+            full_md = clean_markdown(buf.getvalue())
 
             # 存入数据库
-            db = await get_db()
-            try:
+            async with transaction() as db:
                 await db.execute(
                     "UPDATE tasks SET markdown_content = ?, status = 'draft' WHERE id = ? AND user_id = ?",
                     (full_md, task_id, user_id),
                 )
-                await db.commit()
-            finally:
-                await db.close()
 
             raw_path.unlink(missing_ok=True)
             await log_usage(user_id, "generate")
@@ -228,15 +311,11 @@ async def api_update_markdown(
 ):
     """更新 Markdown 内容。"""
     user_id = int(user["sub"])
-    db = await get_db()
-    try:
+    async with transaction() as db:
         await db.execute(
             "UPDATE tasks SET markdown_content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?",
             (markdown, task_id, user_id),
         )
-        await db.commit()
-    finally:
-        await db.close()
     return {"message": "已保存"}
 
 
@@ -251,13 +330,10 @@ async def api_generate_pdf(
 
     # 读取任务信息
     db = await get_db()
-    try:
-        cursor = await db.execute(
-            "SELECT * FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id),
-        )
-        task = await cursor.fetchone()
-    finally:
-        await db.close()
+    cursor = await db.execute(
+        "SELECT * FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id),
+    )
+    task = await cursor.fetchone()
 
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -270,39 +346,45 @@ async def api_generate_pdf(
         try:
             # 保存最新 markdown
             yield _sse({"type": "progress", "pct": 5, "msg": "保存编辑内容..."})
-            db2 = await get_db()
-            try:
-                await db2.execute(
+            async with transaction() as db:
+                await db.execute(
                     "UPDATE tasks SET markdown_content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                     (markdown, task_id),
                 )
-                await db2.commit()
-            finally:
-                await db2.close()
 
-            # 生成试题卷
-            yield _sse({"type": "progress", "pct": 10, "msg": "正在生成试题卷..."})
-            from app.pdf_generator import _compile_single
-            await _compile_single(task_id, markdown, title, school, theme, False, "exam")
+            # 试题卷和答案卷在各自的工作目录中并行编译，完成一个推送一次进度
+            yield _sse({"type": "progress", "pct": 10, "msg": "正在生成试题卷和答案卷..."})
+            from app.pdf_generator import _compile_single, _cancel_and_wait
 
-            yield _sse({"type": "progress", "pct": 55, "msg": "正在生成答案卷..."})
-            await _compile_single(task_id, markdown, title, school, theme, True, "answer")
+            async def build(show_answer: bool, variant: str) -> str:
+                await _compile_single(task_id, markdown, title, school, theme, show_answer, variant)
+                return "答案卷" if show_answer else "试题卷"
 
-            # 更新状态
-            db3 = await get_db()
+            builds = [
+                asyncio.ensure_future(build(False, "exam")),
+                asyncio.ensure_future(build(True, "answer")),
+            ]
             try:
-                await db3.execute(
+                for pct, fut in zip((55, 90), asyncio.as_completed(builds)):
+                    label = await fut
+                    yield _sse({"type": "progress", "pct": pct, "msg": f"{label}已生成"})
+            finally:
+                # 一个失败时取消另一个，并等其 xelatex 子进程退出后再返回
+                await _cancel_and_wait(builds)
+
+            # 更新状态
+            async with transaction() as db:
+                await db.execute(
                     "UPDATE tasks SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                     (task_id,),
                 )
-                await db3.commit()
-            finally:
-                await db3.close()
 
+            # 带上生成时间（纳秒）作为版本号，同一秒内重复生成也不会命中旧 PDF 缓存
+            version = time.time_ns()
             yield _sse({
                 "type": "done",
-                "exam_url": f"/api/tasks/{task_id}/download?type=exam",
-                "answer_url": f"/api/tasks/{task_id}/download?type=answer",
+                "exam_url": f"/api/tasks/{task_id}/download?type=exam&v={version}",
+                "answer_url": f"/api/tasks/{task_id}/download?type=answer&v={version}",
             })
 
         except Exception as e:
@@ -325,13 +407,10 @@ async def api_download(
     """下载 PDF（type=exam 或 answer）。"""
     user_id = int(user["sub"])
     db = await get_db()
-    try:
-        cursor = await db.execute(
-            "SELECT title FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id),
-        )
-        task = await cursor.fetchone()
-    finally:
-        await db.close()
+    cursor = await db.execute(
+        "SELECT title FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id),
+    )
+    task = await cursor.fetchone()
 
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -343,7 +422,14 @@ async def api_download(
 
     suffix = "答案卷" if variant == "answer" else "试题卷"
     filename = f"{task['title']}_{suffix}.pdf"
-    return FileResponse(pdf_path, filename=filename, media_type="application/pdf")
+    response = FileResponse(
+        pdf_path,
+        filename=filename,
+        media_type="application/pdf",
+        headers={"Cache-Control": "private, max-age=3600"},
+    )
+    response.chunk_size = DOWNLOAD_CHUNK_SIZE
+    return response
 
 
 @app.get("/api/me")
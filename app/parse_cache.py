@@ -0,0 +1,86 @@
+"""解析缓存模块 - 按文件内容 SHA-256 缓存提取出的文本。"""
+
+import asyncio
+import os
+import secrets
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from app.config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB
+from app.database import transaction
+
+
+async def get_cached_text(digest: str) -> Optional[str]:
+    """读取缓存的解析结果，命中时刷新使用时间。
+
+    Args:
+        digest: 文件内容摘要
+
+    Returns:
+        缓存的文本，未命中返回 None
+    """
+    path = PARSE_CACHE_DIR / f"{digest}.txt"
+    loop = asyncio.get_running_loop()
+    try:
+        text = await loop.run_in_executor(None, partial(path.read_text, encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    async with transaction() as db:
+        await db.execute(
+            "UPDATE parse_cache SET last_used = CURRENT_TIMESTAMP WHERE digest = ?",
+            (digest,),
+        )
+    return text
+
+
+async def save_cached_text(digest: str, text: str) -> None:
+    """写入解析结果，总大小超过上限时按最久未使用淘汰。
+
+    Args:
+        digest: 文件内容摘要
+        text: 解析出的文本
+    """
+    data = text.encode("utf-8")
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _write_atomic, PARSE_CACHE_DIR / f"{digest}.txt", data)
+
+    limit = PARSE_CACHE_MAX_MB * 1024 * 1024
+    evicted: list[Path] = []
+    async with transaction() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO parse_cache (digest, size) VALUES (?, ?)",
+            (digest, len(data)),
+        )
+        cursor = await db.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache")
+        total = (await cursor.fetchone())[0]
+        if total > limit:
+            cursor = await db.execute(
+                "SELECT digest, size FROM parse_cache ORDER BY last_used"
+            )
+            for row in await cursor.fetchall():
+                if total <= limit:
+                    break
+                await db.execute("DELETE FROM parse_cache WHERE digest = ?", (row["digest"],))
+                evicted.append(PARSE_CACHE_DIR / f"{row['digest']}.txt")
+                total -= row["size"]
+
+    if evicted:
+        await loop.run_in_executor(None, _remove_files, evicted)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """先写同目录下的临时文件再替换，并发读取不会拿到写了一半的缓存（在线程池中执行）。"""
+    tmp_path = path.with_name(f"{path.name}.{secrets.token_hex(8)}.tmp")
+    try:
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _remove_files(paths: list[Path]) -> None:
+    """删除被淘汰的缓存文件（在线程池中执行）。"""
+    for path in paths:
+        path.unlink(missing_ok=True)
@@ -1,12 +1,78 @@
 """PDF 生成模块 - MD → LaTeX → PDF。"""
 
 import asyncio
+import os
 import re
 import shutil
 from pathlib import Path
 
 from app.config import OUTPUT_DIR, LATEX_TEMPLATE_DIR, MD2LATEX_SCRIPT
 
+# AI 返回的 YAML frontmatter
+_FRONTMATTER_RE = re.compile(r'^---\s*\n.*?\n---\s*\n', re.DOTALL)
+
+# XeLaTeX 输出中提示需要再编译一次的标记
+_RERUN_MARKERS = (b"Rerun to get", b"Label(s) may have changed")
+
+# 不复制到工作目录的文件
+_SKIP_FILES = frozenset({".DS_Store"})
+
+# 模板文件列表在进程启动时枚举一次（scandir 的 is_file 直接用目录项类型，无需额外 stat）
+_TEMPLATE_FILES: list[tuple[str, Path]] = [
+    (e.name, Path(e.path)) for e in os.scandir(LATEX_TEMPLATE_DIR)
+    if e.is_file() and e.name not in _SKIP_FILES
+]
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    """以硬链接方式放置只读模板文件，跨文件系统时退回复制。"""
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def _prepare_variant_dir(task_id: int, variant: str) -> Path:
+    """准备变体工作目录：硬链接模板资源，main.tex 单独复制（后续会被修改）。
+
+    Args:
+        task_id: 任务 ID
+        variant: 'exam' 或 'answer'
+
+    Returns:
+        工作目录路径
+    """
+    work_dir = OUTPUT_DIR / str(task_id) / variant
+    work_dir.mkdir(parents=True, exist_ok=True)
+    (work_dir / "content").mkdir(exist_ok=True)
+
+    for name, src in _TEMPLATE_FILES:
+        _link_or_copy(src, work_dir / name)
+
+    main_template = LATEX_TEMPLATE_DIR / "main-template.tex"
+    if main_template.exists():
+        shutil.copy2(main_template, work_dir / "main.tex")
+
+    return work_dir
+
+
+async def _communicate(proc: asyncio.subprocess.Process) -> tuple[bytes, bytes]:
+    """等待子进程结束；所在任务被取消时终止子进程，避免它继续写工作目录。"""
+    try:
+        return await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+
+async def _cancel_and_wait(builds: list[asyncio.Future]) -> None:
+    """取消仍在运行的编译任务，并等待其子进程退出。"""
+    for build in builds:
+        build.cancel()
+    await asyncio.gather(*builds, return_exceptions=True)
+
 
 async def _compile_single(
     task_id: int,
@@ -34,31 +100,17 @@ async def _compile_single(
     Raises:
         RuntimeError: 编译失败
     """
-    work_dir = OUTPUT_DIR / str(task_id) / variant
-    work_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = _prepare_variant_dir(task_id, variant)
     content_dir = work_dir / "content"
-    content_dir.mkdir(exist_ok=True)
 
     # 去掉 AI 返回的 YAML frontmatter，用用户元数据替换
-    markdown_body = re.sub(
-        r'^---\s*\n.*?\n---\s*\n', '', markdown_content, count=1, flags=re.DOTALL
-    )
+    markdown_body = _FRONTMATTER_RE.sub('', markdown_content, count=1)
     md_with_meta = f'---\ntitle: "{title}"\nschool: "{school}"\ntheme: {theme}\n---\n\n{markdown_body}\n'
 
     md_path = content_dir / "exam.md"
     md_path.write_text(md_with_meta, encoding="utf-8")
 
-    # 复制 LaTeX 模板
-    for f in LATEX_TEMPLATE_DIR.iterdir():
-        if f.name != ".DS_Store":
-            dest = work_dir / f.name
-            if f.is_file():
-                shutil.copy2(f, dest)
-
-    main_template = work_dir / "main-template.tex"
     main_tex = work_dir / "main.tex"
-    if main_template.exists():
-        shutil.copy2(main_template, main_tex)
 
     # 答案卷：修改 main.tex 中的全局 showanswer 开关
     if show_answer and main_tex.exists():
@@ -84,11 +136,11 @@ async def _compile_single(
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
     )
-    stdout, stderr = await proc.communicate()
+    stdout, stderr = await _communicate(proc)
     if proc.returncode != 0:
         raise RuntimeError(f"MD→LaTeX 转换失败: {stderr.decode()}")
 
-    # XeLaTeX 编译（两次）
+    # XeLaTeX 编译：交叉引用（总页数、总分等）未稳定时才编译第二次
     for _ in range(2):
         proc = await asyncio.create_subprocess_exec(
             "xelatex",
@@ -99,7 +151,9 @@ async def _compile_single(
             stderr=asyncio.subprocess.PIPE,
             cwd=str(work_dir),
         )
-        stdout, stderr = await proc.communicate()
+        stdout, stderr = await _communicate(proc)
+        if not any(marker in stdout for marker in _RERUN_MARKERS):
+            break
 
     pdf_path = work_dir / "main.pdf"
     if not pdf_path.exists():
@@ -128,12 +182,19 @@ async def generate_both_pdfs(
     Returns:
         (试题卷路径, 答案卷路径)
     """
-    exam_pdf = await _compile_single(
-        task_id, markdown_content, title, school, theme,
-        show_answer=False, variant="exam",
-    )
-    answer_pdf = await _compile_single(
-        task_id, markdown_content, title, school, theme,
-        show_answer=True, variant="answer",
-    )
+    # 两个变体的工作目录互相独立，可以并行编译；一个失败时取消另一个
+    builds = [
+        asyncio.ensure_future(_compile_single(
+            task_id, markdown_content, title, school, theme,
+            show_answer=False, variant="exam",
+        )),
+        asyncio.ensure_future(_compile_single(
+            task_id, markdown_content, title, school, theme,
+            show_answer=True, variant="answer",
+        )),
+    ]
+    try:
+        exam_pdf, answer_pdf = await asyncio.gather(*builds)
+    finally:
+        await _cancel_and_wait(builds)
     return exam_pdf, answer_pdf
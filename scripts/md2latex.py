@@ -9,13 +9,119 @@ md2latex.py - Markdown 试卷转 LaTeX 转换脚本
     python md2latex.py input.md -o output.tex
     python md2latex.py input.md -o output.tex --show-answer
     python md2latex.py *.md -o content/  # 批量转换
+    python md2latex.py *.md -o content/ --cache  # 未修改的文件复用解析结果
 """
 
 import argparse
+import functools
+import hashlib
+import os
+import pickle
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Union
+
+
+# 输出文件写缓冲区大小
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# 解析结果缓存目录（--cache），解析结果结构变化时递增 CACHE_VERSION
+CACHE_DIR = Path('.cache') / 'md2latex'
+CACHE_VERSION = 1
+
+# 预编译正则（模块加载时编译一次）
+_SECTION_RE = re.compile(r'^#\s+(.+?)$', re.MULTILINE)
+_QUESTION_RE = re.compile(r'^##\s+(?:Q?\d*\.?\s*)?\[(\d+)分\]', re.MULTILINE)
+
+# 题目内的各类指令行合并为一个正则，匹配后按 lastgroup（外层分组名）分派
+_LINE_RE = re.compile(
+    r'^(?:'
+    r'(?P<option>-\s*[A-D]\.\s*(?P<option_text>.+))'         # - A. 内容
+    r'|(?P<answer>>\s*答案[:：]\s*(?P<answer_text>.+))'       # > 答案: 内容
+    r'|(?P<lines>>\s*行数[:：]\s*(?P<lines_n>\d+))'          # > 行数: n
+    r'|(?P<staff>>\s*五线谱[:：]\s*(?P<staff_n>\d+))'        # > 五线谱: n
+    r'|(?P<piano>>\s*钢琴谱[:：]\s*(?P<piano_n>\d+))'        # > 钢琴谱: n
+    r'|(?P<essay_box>>\s*要求框[:：]\s*(?P<essay_title>.+))'  # > 要求框: 标题
+    r'|(?P<essay_item>>\s*-\s*(?P<essay_text>.+))'            # > - 要求
+    r')$'
+)
+
+# LaTeX 特殊字符（按顺序替换：~ ^ 的替换结果含 {}，必须排在 { } 之后）
+_LATEX_ESCAPES = (
+    ('&', r'\&'),
+    ('%', r'\%'),
+    ('$', r'\$'),
+    ('#', r'\#'),
+    ('_', r'\_'),
+    ('{', r'\{'),
+    ('}', r'\}'),
+    ('~', r'\textasciitilde{}'),
+    ('^', r'\textasciicircum{}'),
+)
+_SPECIAL_RE = re.compile(r'[&%$#_{}~^]')
+
+# 一次扫描匹配 Markdown 行内格式和已转义字符，其余文本只做特殊字符转义
+_INLINE_RE = re.compile(
+    r'\*\*(?P<bold>.+?)\*\*'
+    # 斜体内容不含 * 和换行，与结束符不重叠，遇到孤立的 * 不会反复回溯
+    r'|(?<![*\\])\*(?P<italic>[^*\n]+)\*(?!\*)'
+    r'|`(?P<code>.+?)`'
+    r'|\\[_&%$#{}]'  # 已转义的字符，保持原样
+)
+_ESCAPED_RE = re.compile(r'\\[_&%$#{}]')
+
+# main.tex 模板中的示例子文件引用
+_EXAMPLE_SUBFILES = (r'\subfile{content/exam1}', r'\subfile{content/exam2}')
+_EXAMPLE_SUBFILE_RES = (
+    re.compile(r'%\s*\\subfile\{content/exam3\}.*\n?'),
+    re.compile(r'%\s*Add more subfiles.*\n?'),
+)
+
+
+def _newline_ends(content: str, pos: int) -> list[int]:
+    """返回从 pos 开始的连续空白中，每个换行符之后的位置。"""
+    ends = []
+    length = len(content)
+    while pos < length and content[pos].isspace():
+        pos += 1
+        if content[pos - 1] == '\n':
+            ends.append(pos)
+    return ends
+
+
+def _find_yaml_header(content: str) -> Optional[tuple[str, int]]:
+    """
+    定位以 --- 开头的 YAML 头部，等价于 ``^---\\s*\\n(.*?)\\n---\\s*\\n``。
+
+    Args:
+        content: Markdown 文件内容
+
+    Returns:
+        (头部内容, 头部结束位置)，没有合法头部时返回 None
+    """
+    # 开始分隔符后的空白可能含多个换行，优先取最后一个（与贪婪匹配一致）
+    for start in reversed(_newline_ends(content, 3)):
+        close = content.find('\n---', start)
+        while close != -1:
+            ends = _newline_ends(content, close + 4)
+            if ends:
+                return content[start:close], ends[-1]
+            close = content.find('\n---', close + 1)
+    return None
+
+
+def _parse_yaml_value(value: str) -> Union[str, bool]:
+    """解析 YAML 值：去掉引号包裹，识别 true/false 布尔值。"""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        value = value[1:-1]
+    lowered = value.lower()
+    if lowered == 'true':
+        return True
+    if lowered == 'false':
+        return False
+    return value
 
 
 def parse_yaml_header(content: str) -> tuple[dict, str]:
@@ -30,66 +136,75 @@ def parse_yaml_header(content: str) -> tuple[dict, str]:
     """
     metadata = {}
 
-    # 匹配 YAML 头部 (--- ... ---)
-    yaml_pattern = r'^---\s*\n(.*?)\n---\s*\n'
-    match = re.match(yaml_pattern, content, re.DOTALL)
+    # 没有 YAML 头部时直接返回，不必扫描全文
+    if not content.startswith('---'):
+        return metadata, content
+
+    # 匹配 YAML 头部 (--- ... ---)，用 str.find 定位结束分隔符
+    match = _find_yaml_header(content)
 
     if match:
-        yaml_content = match.group(1)
-        remaining = content[match.end():]
+        yaml_content, end = match
+        remaining = content[end:]
 
         # 简单解析 YAML (key: value 格式)
         for line in yaml_content.strip().split('\n'):
-            line = line.strip()
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                # 去掉引号包裹
-                if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
-                    value = value[1:-1]
-                # 处理布尔值
-                if value.lower() == 'true':
-                    value = True
-                elif value.lower() == 'false':
-                    value = False
-                metadata[key] = value
+            key, sep, value = line.partition(':')
+            if sep:
+                metadata[key.strip()] = _parse_yaml_value(value.strip())
 
         return metadata, remaining
 
     return metadata, content
 
 
+class Question:
+    """单个题目的解析结果，使用 __slots__ 减少每个题目的内存占用。"""
+
+    __slots__ = ('points', 'stem', 'type', 'options', 'answer', 'answer_num',
+                 'lines', 'staff_lines', 'piano_staff', 'essay_box', 'essay_items')
+
+    def __init__(self, points: int):
+        self.points = points
+        self.stem = ''
+        self.type = 'short'  # 默认类型: choice/short/essay
+        self.options: list[str] = []
+        self.answer = ''
+        self.answer_num = 0
+        self.lines = 0
+        self.staff_lines = 0
+        self.piano_staff = 0
+        self.essay_box: Optional[str] = None
+        self.essay_items: list[str] = []
+
+
 def parse_sections(content: str) -> list[dict]:
     """
-    按 # 标题分割为 sections。
+    按 # 标题分割为 sections，并解析其中的题目。
 
     Args:
         content: 去除 YAML 头部后的内容
 
     Returns:
-        [{'title': '选择题', 'content': '...'}, ...]
+        [{'title': '选择题', 'content': '...', 'questions': [...]}, ...]
     """
     sections = []
 
-    # 按 # 标题分割 (只匹配一级标题)
-    section_pattern = r'^#\s+(.+?)$'
-    parts = re.split(section_pattern, content, flags=re.MULTILINE)
-
-    # parts: ['前导内容', '标题1', '内容1', '标题2', '内容2', ...]
-    if len(parts) > 1:
-        for i in range(1, len(parts), 2):
-            title = parts[i].strip()
-            content_part = parts[i + 1] if i + 1 < len(parts) else ''
-            sections.append({
-                'title': title,
-                'content': content_part.strip()
-            })
+    # 按 # 标题定位 (只匹配一级标题)，标题之间的内容直接切片，前导内容忽略
+    matches = list(_SECTION_RE.finditer(content))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        section_content = content[match.end():end].strip()
+        sections.append({
+            'title': match.group(1).strip(),
+            'content': section_content,
+            'questions': parse_questions(section_content)
+        })
 
     return sections
 
 
-def parse_questions(section_content: str) -> list[dict]:
+def parse_questions(section_content: str) -> list[Question]:
     """
     解析 section 中的题目。
 
@@ -97,19 +212,17 @@ def parse_questions(section_content: str) -> list[dict]:
         section_content: section 的内容
 
     Returns:
-        [{'points': 5, 'stem': '题目内容', 'options': [...], 'answer': '...', ...}, ...]
+        [Question, ...]
     """
     questions = []
 
-    # 按 ## 标题分割题目
+    # 按 ## 标题定位题目，标题之间的内容直接切片
     # 匹配格式: ## Q1 [5分] 或 ## 1. [5分] 或 ## [5分]
-    question_pattern = r'^##\s+(?:Q?\d*\.?\s*)?\[(\d+)分\]'
-    parts = re.split(question_pattern, section_content, flags=re.MULTILINE)
-
-    # parts: ['前导', '分数1', '内容1', '分数2', '内容2', ...]
-    for i in range(1, len(parts), 2):
-        points = int(parts[i])
-        content = parts[i + 1] if i + 1 < len(parts) else ''
+    matches = list(_QUESTION_RE.finditer(section_content))
+    for i, match in enumerate(matches):
+        points = int(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(section_content)
+        content = section_content[match.end():end]
 
         question = parse_single_question(content.strip(), points)
         questions.append(question)
@@ -117,7 +230,7 @@ def parse_questions(section_content: str) -> list[dict]:
     return questions
 
 
-def parse_single_question(content: str, points: int) -> dict:
+def parse_single_question(content: str, points: int) -> Question:
     """
     解析单个题目的内容。
 
@@ -126,80 +239,57 @@ def parse_single_question(content: str, points: int) -> dict:
         points: 分值
 
     Returns:
-        {'points': 5, 'stem': '...', 'type': 'choice/short/essay', ...}
+        解析后的 Question
     """
-    question = {
-        'points': points,
-        'stem': '',
-        'type': 'short',  # 默认类型
-        'options': [],
-        'answer': '',
-        'answer_num': 0,
-        'lines': 0,
-        'staff_lines': 0,
-        'piano_staff': 0,
-        'essay_box': None,
-        'essay_items': []
-    }
-
-    lines = content.split('\n')
+    question = Question(points)
+
     stem_lines = []
     in_essay_box = False
     essay_items = []
 
-    for line in lines:
+    for line in content.splitlines():
         line_stripped = line.strip()
 
-        # 解析选择题选项 (- A. 内容)
-        option_match = re.match(r'^-\s*([A-D])\.\s*(.+)$', line_stripped)
-        if option_match:
-            question['type'] = 'choice'
-            question['options'].append(option_match.group(2))
+        match = _LINE_RE.match(line_stripped)
+        kind = match.lastgroup if match else None
+
+        if kind == 'option':
+            question.type = 'choice'
+            question.options.append(match.group('option_text'))
             continue
 
-        # 解析答案 (> 答案: 内容)
-        answer_match = re.match(r'^>\s*答案[:：]\s*(.+)$', line_stripped)
-        if answer_match:
-            answer_content = answer_match.group(1).strip()
-            question['answer'] = answer_content
+        if kind == 'answer':
+            answer_content = match.group('answer_text').strip()
+            question.answer = answer_content
             # 如果是选择题，解析答案字母对应的数字
-            if question['type'] == 'choice' and len(answer_content) == 1:
+            if question.type == 'choice' and len(answer_content) == 1:
                 answer_letter = answer_content.upper()
                 if answer_letter in 'ABCD':
-                    question['answer_num'] = ord(answer_letter) - ord('A') + 1
+                    question.answer_num = ord(answer_letter) - ord('A') + 1
             continue
 
-        # 解析行数 (> 行数: n)
-        lines_match = re.match(r'^>\s*行数[:：]\s*(\d+)$', line_stripped)
-        if lines_match:
-            question['lines'] = int(lines_match.group(1))
+        if kind == 'lines':
+            question.lines = int(match.group('lines_n'))
             continue
 
-        # 解析五线谱 (> 五线谱: n)
-        staff_match = re.match(r'^>\s*五线谱[:：]\s*(\d+)$', line_stripped)
-        if staff_match:
-            question['staff_lines'] = int(staff_match.group(1))
+        if kind == 'staff':
+            question.staff_lines = int(match.group('staff_n'))
             continue
 
-        # 解析钢琴谱 (> 钢琴谱: n)
-        piano_match = re.match(r'^>\s*钢琴谱[:：]\s*(\d+)$', line_stripped)
-        if piano_match:
-            question['piano_staff'] = int(piano_match.group(1))
+        if kind == 'piano':
+            question.piano_staff = int(match.group('piano_n'))
             continue
 
-        # 解析要求框 (> 要求框: 标题)
-        essaybox_match = re.match(r'^>\s*要求框[:：]\s*(.+)$', line_stripped)
-        if essaybox_match:
-            question['type'] = 'essay'
-            question['essay_box'] = essaybox_match.group(1).strip()
+        if kind == 'essay_box':
+            question.type = 'essay'
+            question.essay_box = match.group('essay_title').strip()
             in_essay_box = True
             continue
 
         # 解析要求框内容 (> - 要求1)
         if in_essay_box:
-            item_match = re.match(r'^>\s*-\s*(.+)$', line_stripped)
-            if item_match:
-                essay_items.append(item_match.group(1).strip())
+            if kind == 'essay_item':
+                essay_items.append(match.group('essay_text').strip())
                 continue
             elif line_stripped.startswith('>'):
                 continue  # 跳过空的引用行
@@ -210,8 +300,8 @@ def parse_single_question(content: str, points: int) -> dict:
         if line_stripped and not line_stripped.startswith('>'):
             stem_lines.append(line_stripped)
 
-    question['stem'] = '\n'.join(stem_lines)
-    question['essay_items'] = essay_items
+    question.stem = '\n'.join(stem_lines)
+    question.essay_items = essay_items
 
     return question
 
@@ -226,103 +316,101 @@ def convert_markdown_formatting(text: str) -> str:
     Returns:
         转换后的文本
     """
-    # 加粗: **text** -> \textbf{text}
-    text = re.sub(r'\*\*(.+?)\*\*', r'\\textbf{\1}', text)
+    # 与 escape_latex 共用 _INLINE_RE，一次扫描完成：
+    # **text** -> \textbf{text}，*text* -> \textit{text}，`code` -> \texttt{code}
+    return _INLINE_RE.sub(_convert_format, text)
+
+
+def _convert_format(match: re.Match) -> str:
+    """convert_markdown_formatting 的替换回调（只转换格式，不转义）。"""
+    kind = match.lastgroup
+    if kind == 'bold':
+        return r'\textbf{' + _INLINE_RE.sub(_convert_format, match.group('bold')) + '}'
+    if kind == 'italic':
+        return r'\textit{' + _INLINE_RE.sub(_convert_format, match.group('italic')) + '}'
+    if kind == 'code':
+        return r'\texttt{' + match.group('code') + '}'
+    return match.group(0)
 
-    # 斜体: *text* -> \textit{text} (注意不要匹配 **)
-    text = re.sub(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)', r'\\textit{\1}', text)
 
-    # 行内代码: `code` -> \texttt{code}
-    text = re.sub(r'`(.+?)`', r'\\texttt{\1}', text)
+def _escape_specials(text: str) -> str:
+    """转义纯文本中的 LaTeX 特殊字符。
 
+    不含特殊字符时直接返回；否则逐个 str.replace（CPython 中比
+    str.translate 快，后者在替换结果多于一个字符时逐字符查表）。
+    """
+    if not _SPECIAL_RE.search(text):
+        return text
+    for char, escaped in _LATEX_ESCAPES:
+        text = text.replace(char, escaped)
     return text
 
 
+def _render(text: str, pattern: re.Pattern, convert) -> str:
+    """用 pattern 切分文本：匹配部分交给 convert，其余部分转义特殊字符。"""
+    parts = []
+    pos = 0
+    for match in pattern.finditer(text):
+        start = match.start()
+        if start > pos:
+            parts.append(_escape_specials(text[pos:start]))
+        parts.append(convert(match))
+        pos = match.end()
+    if not pos:
+        return _escape_specials(text)
+    parts.append(_escape_specials(text[pos:]))
+    return ''.join(parts)
+
+
+def _escape_plain(text: str) -> str:
+    """只转义特殊字符，不处理 Markdown 格式（用于行内代码内容）。"""
+    if '\\' not in text:
+        return _escape_specials(text)
+    return _render(text, _ESCAPED_RE, lambda m: m.group(0))
+
+
+def _convert_inline(match: re.Match) -> str:
+    """_INLINE_RE 匹配部分的转换。"""
+    kind = match.lastgroup
+    if kind == 'bold':
+        return r'\textbf{' + _render(match.group('bold'), _INLINE_RE, _convert_inline) + '}'
+    if kind == 'italic':
+        return r'\textit{' + _render(match.group('italic'), _INLINE_RE, _convert_inline) + '}'
+    if kind == 'code':
+        return r'\texttt{' + _escape_plain(match.group('code')) + '}'
+    return match.group(0)  # 已转义的字符
+
+
 def escape_latex(text) -> str:
     """
     转义 LaTeX 特殊字符并转换 Markdown 格式。
 
+    单次扫描完成：加粗/斜体内部继续转换嵌套格式并转义，
+    行内代码内部只转义特殊字符，已转义的字符（如 \\_）保持原样。
+
     Args:
         text: 原始文本（字符串或其他类型）
 
     Returns:
         转义后的文本
     """
-    if not isinstance(text, str):
-        text = str(text)
-
-    # 先处理 Markdown 格式，保护转换后的 LaTeX 命令
-    # 使用占位符保护 \textbf, \textit, \texttt
-    md_placeholders = []
-
-    def protect_md(match):
-        idx = len(md_placeholders)
-        md_placeholders.append(match.group(0))
-        return f'\x01MD{idx}\x01'
-
-    # 保护加粗
-    text = re.sub(r'\*\*(.+?)\*\*', protect_md, text)
-    # 保护斜体
-    text = re.sub(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)', protect_md, text)
-    # 保护行内代码
-    text = re.sub(r'`(.+?)`', protect_md, text)
-
-    # 先处理已经转义的字符，避免重复转义
-    placeholders = {
-        r'\_': '\x00UNDERSCORE\x00',
-        r'\&': '\x00AMPERSAND\x00',
-        r'\%': '\x00PERCENT\x00',
-        r'\$': '\x00DOLLAR\x00',
-        r'\#': '\x00HASH\x00',
-        r'\{': '\x00LBRACE\x00',
-        r'\}': '\x00RBRACE\x00',
-    }
-
-    # 保护已转义的字符
-    for escaped, placeholder in placeholders.items():
-        text = text.replace(escaped, placeholder)
-
-    # LaTeX 特殊字符
-    special_chars = {
-        '&': r'\&',
-        '%': r'\%',
-        '$': r'\$',
-        '#': r'\#',
-        '_': r'\_',
-        '{': r'\{',
-        '}': r'\}',
-        '~': r'\textasciitilde{}',
-        '^': r'\textasciicircum{}',
-    }
-
-    for char, escaped in special_chars.items():
-        text = text.replace(char, escaped)
+    return _escape_latex_cached(text if isinstance(text, str) else str(text))
 
-    # 恢复已转义的字符
-    for escaped, placeholder in placeholders.items():
-        text = text.replace(placeholder, escaped)
-
-    # 恢复 Markdown 格式并转换为 LaTeX
-    for idx, original in enumerate(md_placeholders):
-        placeholder = f'\x01MD{idx}\x01'
-        # 转换 Markdown 为 LaTeX
-        converted = original
-        # 加粗
-        converted = re.sub(r'\*\*(.+?)\*\*', r'\\textbf{\1}', converted)
-        # 斜体
-        converted = re.sub(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)', r'\\textit{\1}', converted)
-        # 行内代码
-        converted = re.sub(r'`(.+?)`', r'\\texttt{\1}', converted)
-        text = text.replace(placeholder, converted)
 
-    return text
+@functools.lru_cache(maxsize=8192)
+def _escape_latex_cached(text: str) -> str:
+    """escape_latex 的缓存实现，选项、题型标题等重复字符串直接命中缓存。"""
+    # 大部分文本不含 * ` \，无需运行 Markdown 正则，只转义特殊字符
+    if '*' not in text and '`' not in text and '\\' not in text:
+        return _escape_specials(text)
+    return _render(text, _INLINE_RE, _convert_inline)
 
 
 def generate_latex(metadata: dict, sections: list[dict],
                    show_answer: bool = False,
-                   is_subfile: bool = True) -> str:
+                   is_subfile: bool = True) -> Iterator[str]:
     """
-    生成 LaTeX 代码。
+    逐行生成 LaTeX 代码。
 
     Args:
         metadata: YAML 头部元数据
@@ -330,126 +418,164 @@ def generate_latex(metadata: dict, sections: list[dict],
         show_answer: 是否显示答案
         is_subfile: 是否生成子文件格式
 
-    Returns:
-        LaTeX 代码字符串
+    Yields:
+        LaTeX 代码行（不含换行符）
     """
-    lines = []
-
     # 文件头
     if is_subfile:
-        lines.append(r'% 由 md2latex.py 自动生成')
-        lines.append(r'\documentclass[../main.tex]{subfiles}')
-        lines.append(r'\begin{document}')
-        lines.append('')
+        yield r'% 由 md2latex.py 自动生成'
+        yield r'\documentclass[../main.tex]{subfiles}'
+        yield r'\begin{document}'
+        yield ''
 
         # 本地设置
-        lines.append(r'\localshowanswer{%s}' % ('true' if show_answer else 'false'))
-        lines.append(r'\localshowquestion{true}')
-        lines.append('')
+        yield rf'\localshowanswer{{{"true" if show_answer else "false"}}}'
+        yield r'\localshowquestion{true}'
+        yield ''
 
     # 学校名称（放在子文件中，不修改 main.tex）
     if 'school' in metadata:
-        lines.append(r'\setschool{%s}' % escape_latex(metadata['school']))
+        yield rf'\setschool{{{escape_latex(metadata["school"])}}}'
 
     # 主题色
     if 'theme' in metadata:
-        lines.append(r'\setthemecolor{%s}' % metadata['theme'])
+        yield rf'\setthemecolor{{{metadata["theme"]}}}'
 
     if 'school' in metadata or 'theme' in metadata:
-        lines.append('')
+        yield ''
 
     # 试卷头部
     if 'title' in metadata:
-        lines.append(r'\testheader{%s}' % escape_latex(metadata['title']))
-        lines.append('')
+        yield rf'\testheader{{{escape_latex(metadata["title"])}}}'
+        yield ''
 
     # 生成各 section
     for section in sections:
-        lines.append(r'\section{%s}' % escape_latex(section['title']))
-        lines.append('')
+        yield rf'\section{{{escape_latex(section["title"])}}}'
+        yield ''
 
-        questions = parse_questions(section['content'])
+        questions = section['questions']
 
         if questions:
-            lines.append(r'\begin{questions}')
+            yield r'\begin{questions}'
 
             for q in questions:
-                lines.extend(generate_question_latex(q))
+                yield from generate_question_latex(q)
 
-            lines.append(r'\end{questions}')
-            lines.append('')
+            yield r'\end{questions}'
+            yield ''
 
     # 文件尾
     if is_subfile:
-        lines.append(r'\end{document}')
-
-    return '\n'.join(lines)
+        yield r'\end{document}'
 
 
-def generate_question_latex(q: dict) -> list[str]:
+def generate_question_latex(q: Question) -> Iterator[str]:
     """
-    生成单个题目的 LaTeX 代码。
+    逐行生成单个题目的 LaTeX 代码。
 
     Args:
-        q: 题目字典
+        q: 题目
 
-    Returns:
-        LaTeX 代码行列表
+    Yields:
+        LaTeX 代码行（不含换行符）
     """
-    lines = []
-
     # 题目开始
-    lines.append(r'  \item \points{%d}' % q['points'])
+    yield rf'  \item \points{{{q.points:d}}}'
 
     # 要求框（如果有）
-    if q['essay_box']:
-        lines.append(r'  \begin{essaybox}{%s}' % escape_latex(q['essay_box']))
-        for item in q['essay_items']:
-            lines.append(r'    \item %s' % escape_latex(item))
-        lines.append(r'  \end{essaybox}')
-        lines.append('')
+    if q.essay_box:
+        yield rf'  \begin{{essaybox}}{{{escape_latex(q.essay_box)}}}'
+        for item in q.essay_items:
+            yield rf'    \item {escape_latex(item)}'
+        yield r'  \end{essaybox}'
+        yield ''
 
     # 题干
-    if q['stem']:
-        stem_escaped = escape_latex(q['stem'])
+    if q.stem:
+        stem_escaped = escape_latex(q.stem)
         # 处理多行题干
         stem_lines = stem_escaped.split('\n')
-        lines.append(r'  \question{%s}' % stem_lines[0])
+        yield rf'  \question{{{stem_lines[0]}}}'
         for extra_line in stem_lines[1:]:
             if extra_line.strip():
-                lines.append(r'  %s' % extra_line)
+                yield f'  {extra_line}'
 
     # 选择题选项
-    if q['type'] == 'choice' and len(q['options']) == 4:
-        options = [escape_latex(opt) for opt in q['options']]
-        lines.append(r'  \choice{%s}{%s}{%s}{%s}{%d}' % (
-            options[0], options[1], options[2], options[3], q['answer_num']
-        ))
+    if q.type == 'choice' and len(q.options) == 4:
+        options = [escape_latex(opt) for opt in q.options]
+        yield (
+            rf'  \choice{{{options[0]}}}{{{options[1]}}}{{{options[2]}}}{{{options[3]}}}'
+            rf'{{{q.answer_num:d}}}'
+        )
 
     # 答题区域
-    if q['lines'] > 0:
-        lines.append(r'  \answerlines{%d}' % q['lines'])
+    if q.lines > 0:
+        yield rf'  \answerlines{{{q.lines:d}}}'
 
-    if q['staff_lines'] > 0:
-        lines.append(r'  \stafflines{%d}' % q['staff_lines'])
+    if q.staff_lines > 0:
+        yield rf'  \stafflines{{{q.staff_lines:d}}}'
 
-    if q['piano_staff'] > 0:
-        lines.append(r'  \pianostaff{%d}' % q['piano_staff'])
+    if q.piano_staff > 0:
+        yield rf'  \pianostaff{{{q.piano_staff:d}}}'
 
     # 答案
-    if q['answer'] and q['type'] != 'choice':
-        answer_escaped = escape_latex(q['answer'])
-        lines.append(r'  \answer{%s}' % answer_escaped)
+    if q.answer and q.type != 'choice':
+        answer_escaped = escape_latex(q.answer)
+        yield rf'  \answer{{{answer_escaped}}}'
 
-    lines.append('')
+    yield ''
 
-    return lines
+
+def _read_text(path: Path) -> str:
+    """整体读取文件并一次性解码，统一 CRLF 换行。"""
+    return path.read_bytes().decode('utf-8').replace('\r\n', '\n')
+
+
+def _parse_file(input_path: Path) -> tuple[dict, list[dict]]:
+    """读取并解析输入文件，返回 (metadata, sections)。"""
+    metadata, remaining = parse_yaml_header(_read_text(input_path))
+    return metadata, parse_sections(remaining)
+
+
+def _parse_file_cached(input_path: Path) -> tuple[dict, list[dict]]:
+    """
+    解析输入文件，按路径、修改时间和大小复用缓存的解析结果。
+
+    Args:
+        input_path: 输入 Markdown 文件路径
+
+    Returns:
+        (metadata, sections)
+    """
+    stat = input_path.stat()
+    key = f'{input_path.resolve()}\0{stat.st_mtime_ns}\0{stat.st_size}\0{CACHE_VERSION}'
+    cache_path = CACHE_DIR / f'{hashlib.sha256(key.encode()).hexdigest()}.pkl'
+
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.PickleError, AttributeError, ImportError):
+        pass  # 未命中或缓存损坏，重新解析
+
+    parsed = _parse_file(input_path)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免并行转换时读到写了一半的缓存
+        tmp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # 缓存写入失败不影响转换
+    return parsed
 
 
 def convert_file(input_path: Path, output_path: Path,
                  show_answer: bool = False,
                  school: Optional[str] = None,
-                 theme: Optional[str] = None) -> bool:
+                 theme: Optional[str] = None,
+                 use_cache: bool = False) -> bool:
     """
     转换单个文件。
 
@@ -459,17 +585,17 @@ def convert_file(input_path: Path, output_path: Path,
         show_answer: 是否显示答案
         school: 学校名称（覆盖 MD 中的设置）
         theme: 主题色（覆盖 MD 中的设置）
+        use_cache: 是否复用缓存的解析结果
 
     Returns:
         是否成功
     """
     try:
-        # 读取输入文件
-        content = input_path.read_text(encoding='utf-8')
-
-        # 解析
-        metadata, remaining = parse_yaml_header(content)
-        sections = parse_sections(remaining)
+        # 读取并解析输入文件
+        if use_cache:
+            metadata, sections = _parse_file_cached(input_path)
+        else:
+            metadata, sections = _parse_file(input_path)
 
         # 命令行参数覆盖元数据
         if show_answer:
@@ -479,15 +605,22 @@ def convert_file(input_path: Path, output_path: Path,
         if theme:
             metadata['theme'] = theme
 
-        # 生成 LaTeX
-        latex = generate_latex(
+        # 生成 LaTeX 并逐行写入输出文件（大缓冲区，减少 write 调用）
+        latex_lines = generate_latex(
             metadata,
             sections,
             show_answer=metadata.get('show_answer', False)
         )
-
-        # 写入输出文件
-        output_path.write_text(latex, encoding='utf-8')
+        # 先写临时文件，生成完成后再替换，失败时不留下不完整的输出
+        tmp_path = output_path.with_suffix('.tex.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8',
+                      buffering=OUTPUT_BUFFER_SIZE) as f:
+                f.writelines(line + '\n' for line in latex_lines)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
 
         print(f'✓ 转换成功: {input_path} -> {output_path}')
         return True
@@ -511,7 +644,7 @@ def update_main_tex(main_path: Path, subfile_path: Path) -> bool:
         是否成功
     """
     try:
-        content = main_path.read_text(encoding='utf-8')
+        content = _read_text(main_path)
 
         # 计算相对路径（去掉 .tex 后缀）
         subfile_name = subfile_path.stem
@@ -519,16 +652,15 @@ def update_main_tex(main_path: Path, subfile_path: Path) -> bool:
         subfile_ref = f'{subfile_dir}/{subfile_name}'
 
         # 检查是否已经引用了该子文件
-        subfile_pattern = rf'\\subfile\{{{subfile_ref}\}}'
-        if re.search(subfile_pattern, content):
+        if f'\\subfile{{{subfile_ref}}}' in content:
             print(f'  子文件已存在于 main.tex: {subfile_ref}')
             return True
 
-        # 移除示例子文件引用
-        content = re.sub(r'\\subfile\{content/exam1\}\n?', '', content)
-        content = re.sub(r'\\subfile\{content/exam2\}\n?', '', content)
-        content = re.sub(r'%\s*\\subfile\{content/exam3\}.*\n?', '', content)
-        content = re.sub(r'%\s*Add more subfiles.*\n?', '', content)
+        # 移除示例子文件引用（固定文本直接替换，带注释的行仍用正则）
+        for example in _EXAMPLE_SUBFILES:
+            content = content.replace(example + '\n', '').replace(example, '')
+        for pattern in _EXAMPLE_SUBFILE_RES:
+            content = pattern.sub('', content)
 
         # 在 \end{document} 前添加子文件引用
         end_doc = r'\end{document}'
@@ -556,6 +688,7 @@ def main():
   %(prog)s exam.md -o exam.tex --show-answer
   %(prog)s exam.md -o exam.tex --school "学校名称" --update-main main.tex
   %(prog)s *.md -o content/
+  %(prog)s *.md -o content/ --cache
         '''
     )
 
@@ -568,6 +701,8 @@ def main():
     parser.add_argument('--school', help='学校名称')
     parser.add_argument('--update-main', metavar='MAIN_TEX',
                         help='自动更新 main.tex（添加子文件引用和学校名称）')
+    parser.add_argument('--cache', action='store_true',
+                        help='缓存解析结果到 .cache/md2latex/，未修改的文件跳过解析')
 
     args = parser.parse_args()
 
@@ -585,15 +720,23 @@ def main():
         # 输出必须是目录
         output.mkdir(parents=True, exist_ok=True)
 
+        # 各文件互不依赖，用进程池并行转换
+        jobs = [(f, output / f.with_suffix('.tex').name) for f in input_files]
         success = 0
-        for input_file in input_files:
-            output_file = output / input_file.with_suffix('.tex').name
-            if convert_file(input_file, output_file, args.show_answer,
-                          args.school, args.theme):
-                success += 1
-                # 更新 main.tex（仅添加子文件引用）
-                if args.update_main:
-                    update_main_tex(Path(args.update_main), output_file)
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [
+                executor.submit(convert_file, input_file, output_file,
+                                args.show_answer, args.school, args.theme,
+                                args.cache)
+                for input_file, output_file in jobs
+            ]
+            # 按输入顺序取结果，main.tex 由主进程串行更新，子文件顺序与输入一致
+            for (input_file, output_file), future in zip(jobs, futures):
+                if future.result():
+                    success += 1
+                    # 更新 main.tex（仅添加子文件引用）
+                    if args.update_main:
+                        update_main_tex(Path(args.update_main), output_file)
 
         print(f'\n转换完成: {success}/{len(input_files)} 个文件')
 
@@ -603,7 +746,7 @@ def main():
         output_file = output if output.suffix == '.tex' else output / input_file.with_suffix('.tex').name
 
         if not convert_file(input_file, output_file, args.show_answer,
-                          args.school, args.theme):
+                          args.school, args.theme, args.cache):
             sys.exit(1)
 
         # 更新 main.tex（仅添加子文件引用）